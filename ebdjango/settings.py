@@ -105,6 +105,27 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Set REDIS_URL (e.g. redis://localhost:6379/0) to share the cache between
+# server processes; this requires the redis package. Without it each process
+# uses its own in-memory cache.
+
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+
+# Seconds S3 file listings are cached. Uploads and deletions invalidate the
+# cached listings, but only in the cache they can reach, so listing caching is
+# only enabled when the cache is shared by all server processes.
+AWS_S3_LIST_CACHE_TIMEOUT = 30 if os.getenv("REDIS_URL") else 0
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -133,6 +154,12 @@ AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY", "")
 AWS_STORAGE_BUCKET_NAME = os.getenv("AWS_STORAGE_BUCKET_NAME", "polltest-resources")
 AWS_S3_REGION_NAME = os.getenv("AWS_S3_REGION_NAME", "us-west-2")
 AWS_S3_SIGNATURE_VERSION = "s3v4"
+# Maximum number of concurrent S3 requests per process
+AWS_S3_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_S3_MAX_POOL_CONNECTIONS", "50"))
+
+# Keep uploads below the S3 multipart threshold (8 MB) in memory instead of
+# spooling them to a temporary file on disk first
+FILE_UPLOAD_MAX_MEMORY_SIZE = 8 * 1024 * 1024
 
 # Optional: Configure S3 file upload settings
 AWS_S3_FILE_OVERWRITE = False
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PollsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "polls"
+
+    def ready(self):
+        # Load the S3 settings, and fail fast if they are incomplete
+        from . import s3_utils  # noqa: F401
@@ -2,7 +2,7 @@
 URL configuration for S3 file operations
 """
 
-from django.urls import path
+from django.urls import path, re_path
 from . import s3_views
 
 app_name = "s3"
@@ -12,7 +12,17 @@ urlpatterns = [
     path("", s3_views.api_info, name="api_info"),
     # File operations
     path("upload/", s3_views.upload_file, name="upload"),
-    path("download/<str:file_key>/", s3_views.download_file, name="download"),
-    path("delete/<str:file_key>/", s3_views.delete_file, name="delete"),
+    path("upload-batch/", s3_views.upload_files, name="upload_batch"),
+    re_path(
+        r"^(?P<op>download|delete)/(?P<file_key>.+)/$",
+        s3_views.S3FileView.as_view(),
+        name="file",
+    ),
+    path(
+        "presigned/<path:file_key>/",
+        s3_views.download_presigned,
+        name="download_presigned",
+    ),
+    path("delete-batch/", s3_views.delete_files, name="delete_batch"),
     path("list/", s3_views.list_files, name="list"),
 ]
@@ -3,41 +3,193 @@ Utility functions for AWS S3 file operations
 """
 
 import boto3
+import functools
+import hashlib
 import logging
-from botocore.exceptions import ClientError, NoCredentialsError
+import tempfile
+import threading
+from boto3.s3.transfer import TransferConfig
+from botocore.client import Config
+from botocore.exceptions import ClientError, NoCredentialsError, ParamValidationError
 from django.conf import settings
-from typing import Optional, BinaryIO
-import uuid
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.http import content_disposition_header
+from types import MappingProxyType
+from typing import BinaryIO, List, Optional
 
 logger = logging.getLogger(__name__)
 
+# Settings used on every request are read once when the module is loaded
+# (PollsConfig.ready() imports it), so a missing bucket fails at startup
+# instead of on the first request.
+_BUCKET = settings.AWS_STORAGE_BUCKET_NAME
+_REGION = settings.AWS_S3_REGION_NAME
+if not _BUCKET:
+    raise ImproperlyConfigured("AWS_STORAGE_BUCKET_NAME must be set")
+_URL_PREFIX = f"https://{_BUCKET}.s3.{_REGION}.amazonaws.com/"
+
+# boto3 clients are thread-safe, so a single client (and its connection pool)
+# is shared by every request in the process. The transfer manager used for
+# multipart uploads reuses this client too, so TLS connections to S3 are kept
+# alive and reused across all operations without needing a separate
+# urllib3.PoolManager.
+_S3_CLIENT = None
+_S3_CLIENT_LOCK = threading.Lock()
+
+# Size of the client's connection pool, i.e. how many requests it can have in
+# flight at once.
+MAX_POOL_CONNECTIONS = settings.AWS_S3_MAX_POOL_CONNECTIONS
+
+# Files smaller than this are sent with a single PutObject call; larger ones go
+# through the transfer manager as parallel multipart uploads.
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_THRESHOLD,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True,
+)
+
+# Size of the chunks read from an uploaded file while hashing it
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Presigned download URLs are valid for 5 minutes and cached for 4, so a cached
+# URL always has at least a minute left when it is handed out.
+PRESIGNED_URL_EXPIRES_IN = 300
+PRESIGNED_URL_CACHE_TIMEOUT = 240
+
+# Maximum number of keys S3 accepts in a single DeleteObjects request
+DELETE_BATCH_SIZE = 1000
+
+# Listings are cached for a short time. Every cached listing is stored under
+# the current value of a version counter, which uploads and deletions bump so
+# that no stale listing is served after a write. This only holds if every
+# server process shares the cache, so caching is off (timeout 0) unless a
+# shared cache backend is configured.
+LIST_CACHE_TIMEOUT = settings.AWS_S3_LIST_CACHE_TIMEOUT
+LIST_CACHE_VERSION_KEY = "s3list:version"
+
 
 def get_s3_client():
     """
-    Create and return an S3 client using credentials from settings
+    Return the shared S3 client, creating it on first use
     """
+    global _S3_CLIENT
+
+    if _S3_CLIENT is not None:
+        return _S3_CLIENT
+
     try:
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_S3_REGION_NAME,
-        )
-        return s3_client
+        with _S3_CLIENT_LOCK:
+            if _S3_CLIENT is None:
+                _S3_CLIENT = boto3.client(
+                    "s3",
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=_REGION,
+                    config=Config(
+                        signature_version=settings.AWS_S3_SIGNATURE_VERSION,
+                        max_pool_connections=MAX_POOL_CONNECTIONS,
+                        retries={"max_attempts": 3, "mode": "standard"},
+                        tcp_keepalive=True,
+                    ),
+                )
+        return _S3_CLIENT
     except NoCredentialsError:
         logger.error("AWS credentials not found")
         raise
     except Exception as e:
-        logger.error(f"Error creating S3 client: {str(e)}")
+        logger.error("Error creating S3 client: %s", e)
+        raise
+
+
+def _prepare_upload(file_obj: BinaryIO):
+    """
+    Hash the content of a file object and return a rewound file to upload from
+
+    Seekable files, which is what Django hands us for uploads, are hashed in
+    place and rewound. Anything else is copied into a spooled temporary file
+    while it is hashed, so the input is only read once.
+
+    Returns:
+        tuple: The file to upload, its hex digest, and its size in bytes
+    """
+    # SHA-256 matches the checksums S3 itself uses, and OpenSSL's implementation
+    # is hardware accelerated on CPUs with SHA extensions
+    digest = hashlib.sha256()
+
+    if file_obj.seekable():
+        start = file_obj.tell()
+        for chunk in iter(lambda: file_obj.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        size = file_obj.tell() - start
+        file_obj.seek(start)
+        return file_obj, digest.hexdigest(), size
+
+    spooled = tempfile.SpooledTemporaryFile(max_size=MULTIPART_THRESHOLD)
+    for chunk in iter(lambda: file_obj.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+        spooled.write(chunk)
+    size = spooled.tell()
+    spooled.seek(0)
+    return spooled, digest.hexdigest(), size
+
+
+def _object_exists(file_key: str) -> bool:
+    """
+    Return whether an object with the given key is already in the S3 bucket
+
+    Without s3:ListBucket, S3 answers a HEAD on a missing key with 403 rather
+    than 404, so a 403 is also treated as not stored and the file is uploaded.
+    """
+    try:
+        get_s3_client().head_object(Bucket=_BUCKET, Key=file_key)
+        return True
+    except ClientError as e:
+        error_code = e.response.get("Error", {}).get("Code", "")
+        if error_code in ("404", "NoSuchKey"):
+            return False
+        if error_code in ("403", "AccessDenied"):
+            logger.warning(
+                "Access denied checking for existing file, uploading it: %s",
+                file_key,
+            )
+            return False
         raise
 
 
+def _cache_key(namespace: str, *parts) -> str:
+    """
+    Return a cache key for the given parts that every cache backend accepts
+
+    S3 keys and continuation tokens can contain spaces and be up to about 1KB
+    long, which memcached rejects, so the parts are hashed.
+    """
+    digest = hashlib.sha256("\0".join(str(part) for part in parts).encode())
+    return f"{namespace}:{digest.hexdigest()}"
+
+
+@functools.lru_cache(maxsize=64)
+def _upload_extra_args(content_type: Optional[str]) -> MappingProxyType:
+    """
+    Return the extra upload parameters for a content type
+
+    The result is cached and shared between uploads, so it is read-only.
+    """
+    return MappingProxyType({"ContentType": content_type} if content_type else {})
+
+
 def upload_file_to_s3(
     file_obj: BinaryIO, filename: str, content_type: Optional[str] = None
 ) -> dict:
     """
     Upload a file to S3 bucket
 
+    Files are stored under a key derived from a hash of their content, so
+    uploading the same file twice stores it only once.
+
     Args:
         file_obj: File object to upload
         filename: Name to save the file as in S3
@@ -46,39 +198,56 @@ def upload_file_to_s3(
     Returns:
         dict: Response containing success status, file_key, and url
     """
-    if not settings.AWS_STORAGE_BUCKET_NAME:
-        return {"success": False, "error": "S3 bucket name not configured"}
-
     try:
-        s3_client = get_s3_client()
-
-        # Generate unique filename to avoid collisions
-        # file_extension = filename.split(".")[-1] if "." in filename else ""
-        unique_filename = f"{uuid.uuid4().hex}_{filename}"
-
-        # Prepare upload parameters
-        extra_args = {}
-        if content_type:
-            extra_args["ContentType"] = content_type
-
-        # Upload file
-        s3_client.upload_fileobj(
-            file_obj,
-            settings.AWS_STORAGE_BUCKET_NAME,
-            unique_filename,
-            ExtraArgs=extra_args if extra_args else None,
-        )
+        extra_args = _upload_extra_args(content_type)
 
-        # Generate file URL
-        file_url = f"https://{settings.AWS_STORAGE_BUCKET_NAME}.s3.{settings.AWS_S3_REGION_NAME}.amazonaws.com/{unique_filename}"
+        upload_obj, digest, size = _prepare_upload(file_obj)
+
+        try:
+            file_key = f"{digest}/{filename}"
+
+            # Skip the upload if identical content is already stored
+            deduplicated = _object_exists(file_key)
+
+            if deduplicated:
+                logger.info("File already stored, skipped upload: %s", file_key)
+            elif size < MULTIPART_THRESHOLD:
+                # Small files skip the transfer manager and its thread pool
+                get_s3_client().put_object(
+                    Bucket=_BUCKET,
+                    Key=file_key,
+                    Body=upload_obj,
+                    **extra_args,
+                )
+                logger.info("Successfully uploaded file: %s", file_key)
+            else:
+                get_s3_client().upload_fileobj(
+                    upload_obj,
+                    _BUCKET,
+                    file_key,
+                    # The transfer manager may add defaults to ExtraArgs in
+                    # place, so it gets its own copy of the shared mapping
+                    ExtraArgs=dict(extra_args),
+                    Config=TRANSFER_CONFIG,
+                )
+                logger.info("Successfully uploaded file: %s", file_key)
+        finally:
+            # Only close the temporary copy, never the caller's file
+            if upload_obj is not file_obj:
+                upload_obj.close()
 
-        logger.info(f"Successfully uploaded file: {unique_filename}")
+        if not deduplicated:
+            _invalidate_list_cache()
+
+        # Generate file URL
+        file_url = _URL_PREFIX + file_key
 
         return {
             "success": True,
-            "file_key": unique_filename,
+            "file_key": file_key,
             "url": file_url,
             "original_filename": filename,
+            "deduplicated": deduplicated,
         }
 
     except ClientError as e:
@@ -91,41 +260,54 @@ def upload_file_to_s3(
         return {"success": False, "error": error_msg}
 
 
-def download_file_from_s3(file_key: str) -> dict:
+def download_file_from_s3(file_key: str, if_none_match: Optional[str] = None) -> dict:
     """
     Download a file from S3 bucket
 
     Args:
         file_key: The key (filename) of the file in S3
+        if_none_match: ETag(s) the client already has; if the file still
+            matches, S3 returns no body and the result has not_modified set
 
     Returns:
-        dict: Response containing success status, file_content, and metadata
+        dict: Response containing success status, the open streaming body,
+        and metadata
     """
-    if not settings.AWS_STORAGE_BUCKET_NAME:
-        return {"success": False, "error": "S3 bucket name not configured"}
-
     try:
-        s3_client = get_s3_client()
+        params = {"Bucket": _BUCKET, "Key": file_key}
+        if if_none_match:
+            params["IfNoneMatch"] = if_none_match
 
         # Get file from S3
-        response = s3_client.get_object(
-            Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=file_key
-        )
+        response = get_s3_client().get_object(**params)
 
-        file_content = response["Body"].read()
         content_type = response.get("ContentType", "application/octet-stream")
 
-        logger.info(f"Successfully downloaded file: {file_key}")
+        logger.info("Successfully opened file for download: %s", file_key)
 
+        # The body is returned unread so the caller can stream it; the caller
+        # is responsible for closing it.
         return {
             "success": True,
-            "file_content": file_content,
+            "body": response["Body"],
             "content_type": content_type,
+            "content_length": response.get("ContentLength"),
+            "etag": response.get("ETag"),
             "file_key": file_key,
         }
 
     except ClientError as e:
         error_code = e.response.get("Error", {}).get("Code", "")
+        if error_code in ("304", "NotModified"):
+            logger.info("File not modified: %s", file_key)
+            # S3 sends the object's current ETag with the 304
+            headers = e.response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+            return {
+                "success": True,
+                "not_modified": True,
+                "etag": headers.get("etag"),
+                "file_key": file_key,
+            }
         if error_code == "NoSuchKey":
             error_msg = f"File not found: {file_key}"
         else:
@@ -138,6 +320,48 @@ def download_file_from_s3(file_key: str) -> dict:
         return {"success": False, "error": error_msg}
 
 
+def generate_presigned_download_url(file_key: str, filename: str) -> dict:
+    """
+    Generate a presigned URL that lets the client download a file directly
+    from S3
+
+    Args:
+        file_key: The key (filename) of the file in S3
+        filename: Name the browser should save the file as
+
+    Returns:
+        dict: Response containing success status and the presigned url
+    """
+    cache_key = _cache_key("s3presigned", file_key)
+
+    try:
+        url = cache.get(cache_key)
+        if url is None:
+            url = get_s3_client().generate_presigned_url(
+                "get_object",
+                Params={
+                    "Bucket": _BUCKET,
+                    "Key": file_key,
+                    "ResponseContentDisposition": content_disposition_header(
+                        True, filename
+                    ),
+                },
+                ExpiresIn=PRESIGNED_URL_EXPIRES_IN,
+            )
+            cache.set(cache_key, url, PRESIGNED_URL_CACHE_TIMEOUT)
+
+        return {"success": True, "url": url, "file_key": file_key}
+
+    except ClientError as e:
+        error_msg = f"AWS ClientError: {str(e)}"
+        logger.error(error_msg)
+        return {"success": False, "error": error_msg}
+    except Exception as e:
+        error_msg = f"Unexpected error generating download url: {str(e)}"
+        logger.error(error_msg)
+        return {"success": False, "error": error_msg}
+
+
 def delete_file_from_s3(file_key: str) -> dict:
     """
     Delete a file from S3 bucket
@@ -148,68 +372,232 @@ def delete_file_from_s3(file_key: str) -> dict:
     Returns:
         dict: Response containing success status
     """
-    if not settings.AWS_STORAGE_BUCKET_NAME:
-        return {"success": False, "error": "S3 bucket name not configured"}
+    result = delete_files_from_s3([file_key])
 
-    try:
-        s3_client = get_s3_client()
+    if not result["success"]:
+        return {"success": False, "error": result["error"]}
 
-        s3_client.delete_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=file_key)
+    return {"success": True, "file_key": file_key}
 
-        logger.info(f"Successfully deleted file: {file_key}")
 
-        return {"success": True, "file_key": file_key}
+def delete_files_from_s3(file_keys: List[str]) -> dict:
+    """
+    Delete several files from S3 bucket, up to DELETE_BATCH_SIZE per request
+
+    Args:
+        file_keys: The keys (filenames) of the files in S3
+
+    Returns:
+        dict: Response containing success status, the deleted keys, and the
+        keys that could not be deleted along with the reason. If a request
+        fails, the keys deleted by earlier requests are still reported.
+    """
+    deleted = []
+    errors = []
+    try:
+        for start in range(0, len(file_keys), DELETE_BATCH_SIZE):
+            batch = file_keys[start : start + DELETE_BATCH_SIZE]
+            # Quiet mode only reports the keys that failed
+            response = get_s3_client().delete_objects(
+                Bucket=_BUCKET,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+            batch_errors = [
+                {
+                    "file_key": error["Key"],
+                    "error": error.get("Message", error.get("Code", "")),
+                }
+                for error in response.get("Errors", [])
+            ]
+            errors.extend(batch_errors)
+
+            failed_keys = {error["file_key"] for error in batch_errors}
+            batch_deleted = [key for key in batch if key not in failed_keys]
+            if batch_deleted:
+                deleted.extend(batch_deleted)
+                # Invalidate after every batch so that listings are correct
+                # even if a later batch fails
+                _invalidate_list_cache()
+
+        logger.info("Successfully deleted %d files", len(deleted))
+
+        if errors:
+            error_msg = f"Failed to delete {len(errors)} of {len(file_keys)} files"
+            logger.error(error_msg)
+            return {
+                "success": False,
+                "error": error_msg,
+                "deleted": deleted,
+                "errors": errors,
+            }
+
+        return {"success": True, "deleted": deleted, "errors": []}
 
     except ClientError as e:
         error_msg = f"AWS ClientError: {str(e)}"
         logger.error(error_msg)
-        return {"success": False, "error": error_msg}
+        return {
+            "success": False,
+            "error": error_msg,
+            "deleted": deleted,
+            "errors": errors,
+        }
     except Exception as e:
-        error_msg = f"Unexpected error deleting file: {str(e)}"
+        error_msg = f"Unexpected error deleting files: {str(e)}"
         logger.error(error_msg)
-        return {"success": False, "error": error_msg}
+        return {
+            "success": False,
+            "error": error_msg,
+            "deleted": deleted,
+            "errors": errors,
+        }
 
 
-def list_files_in_s3(prefix: str = "", max_keys: int = 100) -> dict:
+def _iter_s3_objects(page_iterator):
     """
-    List files in S3 bucket
+    Yield a summary dict for every object in a list_objects_v2 page iterator
+    """
+    for page in page_iterator:
+        for obj in page.get("Contents", []):
+            yield {
+                "key": obj["Key"],
+                "size": obj["Size"],
+                "last_modified": obj["LastModified"],
+            }
+
+
+def _list_cache_version() -> int:
+    """
+    Return the current version of the cached listings
+    """
+    return cache.get_or_set(LIST_CACHE_VERSION_KEY, 1, timeout=None)
+
+
+def _invalidate_list_cache():
+    """
+    Invalidate every cached listing by bumping the listing cache version
+    """
+    if not LIST_CACHE_TIMEOUT:
+        return
+
+    try:
+        cache.incr(LIST_CACHE_VERSION_KEY)
+    except ValueError:
+        # No version yet, so nothing has been cached
+        pass
+    except Exception as e:
+        # The write this follows has already succeeded, so a cache outage is
+        # not allowed to report it as failed
+        logger.warning("Could not invalidate cached listings: %s", e)
+
+
+def list_files_in_s3(
+    prefix: str = "", max_keys: int = 100, continuation_token: Optional[str] = None
+) -> dict:
+    """
+    List files in S3 bucket, serving repeated listings from the cache
 
     Args:
         prefix: Filter results to files starting with this prefix
         max_keys: Maximum number of files to return
+        continuation_token: Token returned by a previous call, to resume the
+            listing where it stopped
 
     Returns:
-        dict: Response containing success status and list of files
+        dict: Response containing success status, list of files, and the
+        continuation token to fetch the next batch (None when exhausted)
     """
-    if not settings.AWS_STORAGE_BUCKET_NAME:
-        return {"success": False, "error": "S3 bucket name not configured"}
+    if not LIST_CACHE_TIMEOUT:
+        return _list_files_from_s3(prefix, max_keys, continuation_token)
+
+    cache_key = _cache_key("s3list", prefix, max_keys, continuation_token or "")
 
+    # The cache is only an optimization, so if it is unavailable the listing
+    # comes straight from S3
     try:
-        s3_client = get_s3_client()
+        version = _list_cache_version()
+        result = cache.get(cache_key, version=version)
+    except Exception as e:
+        logger.warning("Could not read cached listing: %s", e)
+        return _list_files_from_s3(prefix, max_keys, continuation_token)
+
+    if result is None:
+        result = _list_files_from_s3(prefix, max_keys, continuation_token)
+        # Errors are not cached so the next request retries S3
+        if result["success"]:
+            try:
+                cache.set(cache_key, result, LIST_CACHE_TIMEOUT, version=version)
+            except Exception as e:
+                logger.warning("Could not cache listing: %s", e)
 
-        response = s3_client.list_objects_v2(
-            Bucket=settings.AWS_STORAGE_BUCKET_NAME, Prefix=prefix, MaxKeys=max_keys
+    return result
+
+
+def _list_files_from_s3(
+    prefix: str, max_keys: int, continuation_token: Optional[str]
+) -> dict:
+    """
+    List files in S3 bucket
+
+    Args:
+        prefix: Filter results to files starting with this prefix
+        max_keys: Maximum number of files to return
+        continuation_token: Token returned by a previous call, to resume the
+            listing where it stopped
+
+    Returns:
+        dict: Response containing success status, list of files, and the
+        continuation token to fetch the next batch (None when exhausted).
+        On failure, invalid_token is set if S3 or botocore rejected the
+        continuation token.
+    """
+    try:
+        pagination_config = {"MaxItems": max_keys, "PageSize": min(max_keys, 1000)}
+        if continuation_token:
+            pagination_config["StartingToken"] = continuation_token
+
+        page_iterator = (
+            get_s3_client()
+            .get_paginator("list_objects_v2")
+            .paginate(
+                Bucket=_BUCKET,
+                Prefix=prefix,
+                PaginationConfig=pagination_config,
+            )
         )
 
-        files = []
-        if "Contents" in response:
-            for obj in response["Contents"]:
-                files.append(
-                    {
-                        "key": obj["Key"],
-                        "size": obj["Size"],
-                        "last_modified": obj["LastModified"].isoformat(),
-                    }
-                )
+        files = list(_iter_s3_objects(page_iterator))
+        next_token = page_iterator.resume_token
 
-        logger.info(f"Successfully listed {len(files)} files")
+        logger.info("Successfully listed %d files", len(files))
 
-        return {"success": True, "files": files, "count": len(files)}
+        return {
+            "success": True,
+            "files": files,
+            "count": len(files),
+            "continuation_token": next_token,
+            "is_truncated": next_token is not None,
+        }
 
     except ClientError as e:
+        error_code = e.response.get("Error", {}).get("Code", "")
+        if continuation_token and error_code == "InvalidArgument":
+            error_msg = f"Invalid continuation token: {continuation_token}"
+            logger.error(error_msg)
+            return {"success": False, "error": error_msg, "invalid_token": True}
         error_msg = f"AWS ClientError: {str(e)}"
         logger.error(error_msg)
         return {"success": False, "error": error_msg}
+    except (ValueError, ParamValidationError) as e:
+        # botocore raises these for starting tokens it cannot decode, or that
+        # decode to parameters ListObjectsV2 does not accept
+        if continuation_token:
+            error_msg = f"Invalid continuation token: {continuation_token}"
+            logger.error(error_msg)
+            return {"success": False, "error": error_msg, "invalid_token": True}
+        error_msg = f"Unexpected error listing files: {str(e)}"
+        logger.error(error_msg)
+        return {"success": False, "error": error_msg}
     except Exception as e:
         error_msg = f"Unexpected error listing files: {str(e)}"
         logger.error(error_msg)
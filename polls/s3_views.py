@@ -2,21 +2,120 @@
 Views for S3 file upload and download operations
 """
 
-from django.http import JsonResponse, HttpResponse, FileResponse
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseNotAllowed,
+    HttpResponseNotModified,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.utils.decorators import method_decorator
+from django.utils.http import content_disposition_header
+from django.views import View
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
-import json
+from django.views.decorators.http import etag, require_http_methods
+import orjson
 from .s3_utils import (
+    MAX_POOL_CONNECTIONS,
     upload_file_to_s3,
     download_file_from_s3,
+    generate_presigned_download_url,
     delete_file_from_s3,
+    delete_files_from_s3,
     list_files_in_s3,
 )
 
+# Size of the chunks read from S3 and written to the client when streaming
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Default and maximum number of files returned by list_files. The maximum is
+# what S3 returns in a single ListObjectsV2 call.
+DEFAULT_MAX_KEYS = 100
+MAX_KEYS_LIMIT = 1000
+
+# S3 keys, and therefore useful prefixes, are at most 1024 bytes long
+MAX_PREFIX_BYTES = 1024
+
+
+def json_response(data, status=200):
+    """
+    Return an HttpResponse with data serialized to JSON by orjson
+
+    orjson is much faster than the json module behind JsonResponse and
+    serializes datetimes natively.
+    """
+    return HttpResponse(
+        orjson.dumps(data, option=orjson.OPT_NAIVE_UTC),
+        content_type="application/json",
+        status=status,
+    )
+
+
+def _filename_from_key(file_key):
+    """
+    Return the original filename of an uploaded file from its S3 key
+    """
+    # Keys are "<content hash>/<filename>"; files uploaded before content
+    # addressing use "<uuid>_<filename>"
+    if "/" in file_key:
+        return file_key.rsplit("/", 1)[1]
+    return file_key.split("_", 1)[1] if "_" in file_key else file_key
+
+
+class S3FileResponse(FileResponse):
+    """
+    FileResponse that reads S3 bodies in DOWNLOAD_CHUNK_SIZE blocks
+    """
+
+    block_size = DOWNLOAD_CHUNK_SIZE
+
+
+# boto3 is blocking, so S3 calls run on this pool to keep the event loop free.
+# It has one thread per connection in the client's pool, but threads can still
+# wait for a connection: each multipart upload runs up to
+# TRANSFER_CONFIG.max_concurrency more transfer threads on the same pool, and
+# streaming downloads hold their connection between reads.
+S3_EXECUTOR = ThreadPoolExecutor(
+    max_workers=MAX_POOL_CONNECTIONS, thread_name_prefix="s3"
+)
+
+
+# Batch uploads run on their own, smaller pool, so a request with many files
+# cannot take every S3_EXECUTOR thread and hold up other requests' S3 calls.
+UPLOAD_BATCH_EXECUTOR = ThreadPoolExecutor(
+    max_workers=16, thread_name_prefix="s3-upload-batch"
+)
+
+
+async def run_in_s3_executor(func, *args):
+    """
+    Run a blocking S3 function on the shared executor and await its result
+    """
+    return await asyncio.get_running_loop().run_in_executor(S3_EXECUTOR, func, *args)
+
+
+async def _stream_body(body, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """
+    Yield an S3 streaming body in chunks, releasing its connection when done
+    """
+    try:
+        while True:
+            chunk = await run_in_s3_executor(body.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        body.close()
+
 
 @csrf_exempt
 @require_http_methods(["POST"])
-def upload_file(request):
+async def upload_file(request):
     """
     Upload a file to S3
 
@@ -29,7 +128,7 @@ def upload_file(request):
         JSON response with upload status and file details
     """
     if "file" not in request.FILES:
-        return JsonResponse(
+        return json_response(
             {
                 "success": False,
                 "error": "No file provided. Please include a file in the request.",
@@ -43,162 +142,430 @@ def upload_file(request):
     content_type = uploaded_file.content_type
 
     # Upload to S3
-    result = upload_file_to_s3(uploaded_file.file, uploaded_file.name, content_type)
+    result = await run_in_s3_executor(
+        upload_file_to_s3, uploaded_file.file, uploaded_file.name, content_type
+    )
 
     if result["success"]:
-        return JsonResponse(
+        return json_response(
             {
                 "success": True,
                 "message": "File uploaded successfully",
                 "file_key": result["file_key"],
                 "url": result["url"],
                 "original_filename": result["original_filename"],
+                "deduplicated": result["deduplicated"],
             },
             status=201,
         )
     else:
-        return JsonResponse(
+        return json_response(
             {"success": False, "error": result.get("error", "Unknown error occurred")},
             status=500,
         )
 
 
+@csrf_exempt
+@require_http_methods(["POST"])
+async def upload_files(request):
+    """
+    Upload several files to S3 in parallel
+
+    Expects multipart/form-data with one or more files fields
+
+    Example usage with curl:
+    curl -X POST -F "files=@a.txt" -F "files=@b.txt" http://localhost:8000/s3/upload-batch/
+
+    Returns:
+        JSON response with the upload result of each file, in request order
+    """
+    uploaded_files = request.FILES.getlist("files")
+    if not uploaded_files:
+        return json_response(
+            {
+                "success": False,
+                "error": "No files provided. Please include one or more files "
+                "fields in the request.",
+            },
+            status=400,
+        )
+
+    # Upload the files concurrently on the batch upload executor
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                UPLOAD_BATCH_EXECUTOR,
+                upload_file_to_s3,
+                uploaded_file.file,
+                uploaded_file.name,
+                uploaded_file.content_type,
+            )
+            for uploaded_file in uploaded_files
+        )
+    )
+
+    files = []
+    for uploaded_file, result in zip(uploaded_files, results):
+        if result["success"]:
+            files.append(
+                {
+                    "success": True,
+                    "file_key": result["file_key"],
+                    "url": result["url"],
+                    "original_filename": result["original_filename"],
+                    "deduplicated": result["deduplicated"],
+                }
+            )
+        else:
+            files.append(
+                {
+                    "success": False,
+                    "original_filename": uploaded_file.name,
+                    "error": result.get("error", "Unknown error occurred"),
+                }
+            )
+
+    if all(result["success"] for result in results):
+        return json_response(
+            {
+                "success": True,
+                "message": "Files uploaded successfully",
+                "files": files,
+                "count": len(files),
+            },
+            status=201,
+        )
+    else:
+        return json_response(
+            {
+                "success": False,
+                "error": "One or more files failed to upload",
+                "files": files,
+            },
+            status=500,
+        )
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class S3FileView(View):
+    """
+    Download or delete a single file from S3
+
+    Both operations share one URL pattern, /s3/<op>/<file_key>/, where op is
+    "download" (GET) or "delete" (DELETE), so the resolver only has to try a
+    single regex for them.
+    """
+
+    http_method_names = ["get", "delete", "options"]
+
+    async def get(self, request, op, file_key):
+        """
+        Download a file from S3
+
+        Args:
+            file_key: The S3 key (filename) of the file to download
+
+        Example usage:
+        curl -O http://localhost:8000/s3/download/<file_key>/
+
+        Returns:
+            File content streamed as a downloadable response, or 304 Not
+            Modified if the client's If-None-Match still matches the file
+
+        Prefer download_presigned, which lets the client fetch the file from S3
+        directly instead of proxying every byte through Django.
+        """
+        if op != "download":
+            return HttpResponseNotAllowed(["DELETE"])
+
+        result = await run_in_s3_executor(
+            download_file_from_s3, file_key, request.META.get("HTTP_IF_NONE_MATCH")
+        )
+
+        if result.get("not_modified"):
+            response = HttpResponseNotModified()
+            if result["etag"]:
+                response["ETag"] = result["etag"]
+            return response
+        elif result["success"]:
+            filename = _filename_from_key(file_key)
+            if isinstance(request, ASGIRequest):
+                # ASGI servers buffer synchronous iterators, so stream through
+                # an async generator
+                response = StreamingHttpResponse(
+                    _stream_body(result["body"]), content_type=result["content_type"]
+                )
+                response["Content-Disposition"] = content_disposition_header(
+                    True, filename
+                )
+            else:
+                # Under WSGI the body is handed to the server's wsgi.file_wrapper,
+                # which can send it without going through Django's iterator
+                response = S3FileResponse(
+                    result["body"],
+                    content_type=result["content_type"],
+                    as_attachment=True,
+                    filename=filename,
+                )
+            if result["content_length"] is not None:
+                response["Content-Length"] = result["content_length"]
+            if result["etag"]:
+                response["ETag"] = result["etag"]
+            return response
+        else:
+            return json_response(
+                {"success": False, "error": result.get("error", "File not found")},
+                status=404,
+            )
+
+    async def delete(self, request, op, file_key):
+        """
+        Delete a file from S3
+
+        Args:
+            file_key: The S3 key (filename) of the file to delete
+
+        Example usage with curl:
+        curl -X DELETE http://localhost:8000/s3/delete/<file_key>/
+
+        Returns:
+            JSON response with deletion status
+        """
+        if op != "delete":
+            return HttpResponseNotAllowed(["GET"])
+
+        result = await run_in_s3_executor(delete_file_from_s3, file_key)
+
+        if result["success"]:
+            return json_response(
+                {
+                    "success": True,
+                    "message": "File deleted successfully",
+                    "file_key": result["file_key"],
+                },
+                status=200,
+            )
+        else:
+            return json_response(
+                {
+                    "success": False,
+                    "error": result.get("error", "Unknown error occurred"),
+                },
+                status=500,
+            )
+
+
 @require_http_methods(["GET"])
-def download_file(request, file_key):
+async def download_presigned(request, file_key):
     """
-    Download a file from S3
+    Redirect to a presigned S3 URL for a file
 
     Args:
         file_key: The S3 key (filename) of the file to download
 
     Example usage:
-    curl -O http://localhost:8000/s3/download/<file_key>/
+    curl -L -O http://localhost:8000/s3/presigned/<file_key>/
 
     Returns:
-        File content as downloadable response
+        Redirect to a short-lived S3 URL that downloads the file
     """
-    result = download_file_from_s3(file_key)
+    result = await run_in_s3_executor(
+        generate_presigned_download_url, file_key, _filename_from_key(file_key)
+    )
 
     if result["success"]:
-        response = HttpResponse(
-            result["file_content"], content_type=result["content_type"]
-        )
-        # Extract original filename from file_key (remove UUID prefix)
-        filename = file_key.split("_", 1)[1] if "_" in file_key else file_key
-        response["Content-Disposition"] = f'attachment; filename="{filename}"'
-        return response
+        return HttpResponseRedirect(result["url"])
     else:
-        return JsonResponse(
-            {"success": False, "error": result.get("error", "File not found")},
-            status=404,
+        return json_response(
+            {"success": False, "error": result.get("error", "Unknown error occurred")},
+            status=500,
         )
 
 
 @csrf_exempt
-@require_http_methods(["DELETE"])
-def delete_file(request, file_key):
+@require_http_methods(["POST"])
+async def delete_files(request):
     """
-    Delete a file from S3
+    Delete several files from S3
 
-    Args:
-        file_key: The S3 key (filename) of the file to delete
+    Expects a JSON body with the list of S3 keys to delete:
+    {"keys": ["<file_key>", ...]}
 
     Example usage with curl:
-    curl -X DELETE http://localhost:8000/s3/delete/<file_key>/
+    curl -X POST -d '{"keys": ["<file_key>"]}' http://localhost:8000/s3/delete-batch/
 
     Returns:
-        JSON response with deletion status
+        JSON response with the deleted keys and any keys that failed
     """
-    result = delete_file_from_s3(file_key)
+    try:
+        file_keys = orjson.loads(request.body).get("keys")
+    except (ValueError, AttributeError):
+        file_keys = None
+
+    if (
+        not isinstance(file_keys, list)
+        or not file_keys
+        or not all(isinstance(key, str) and key for key in file_keys)
+    ):
+        return json_response(
+            {
+                "success": False,
+                "error": 'Request body must be JSON of the form {"keys": ["..."]}.',
+            },
+            status=400,
+        )
+
+    result = await run_in_s3_executor(delete_files_from_s3, file_keys)
 
     if result["success"]:
-        return JsonResponse(
+        return json_response(
             {
                 "success": True,
-                "message": "File deleted successfully",
-                "file_key": result["file_key"],
+                "message": "Files deleted successfully",
+                "deleted": result["deleted"],
+                "count": len(result["deleted"]),
             },
             status=200,
         )
     else:
-        return JsonResponse(
-            {"success": False, "error": result.get("error", "Unknown error occurred")},
+        return json_response(
+            {
+                "success": False,
+                "error": result.get("error", "Unknown error occurred"),
+                "deleted": result.get("deleted", []),
+                "errors": result.get("errors", []),
+            },
             status=500,
         )
 
 
 @require_http_methods(["GET"])
-def list_files(request):
+async def list_files(request):
     """
     List files in S3 bucket
 
     Query parameters:
         prefix: Filter files by prefix (optional)
-        max_keys: Maximum number of files to return (optional, default: 100)
+        max_keys: Maximum number of files to return (optional, default: 100,
+            capped at 1000)
+        continuation_token: Token from a previous truncated response, to fetch
+            the next batch (optional)
 
     Example usage:
     curl http://localhost:8000/s3/list/
     curl http://localhost:8000/s3/list/?prefix=images/&max_keys=50
+    curl http://localhost:8000/s3/list/?continuation_token=<token>
 
     Returns:
         JSON response with list of files
     """
     prefix = request.GET.get("prefix", "")
-    max_keys = int(request.GET.get("max_keys", 100))
+    if len(prefix.encode()) >= MAX_PREFIX_BYTES:
+        return json_response(
+            {
+                "success": False,
+                "error": f"prefix must be shorter than {MAX_PREFIX_BYTES} bytes.",
+            },
+            status=400,
+        )
 
-    result = list_files_in_s3(prefix, max_keys)
+    # Invalid values fall back to the default rather than raising
+    max_keys_raw = request.GET.get("max_keys")
+    if max_keys_raw and max_keys_raw.isascii() and max_keys_raw.isdigit():
+        max_keys = min(max(int(max_keys_raw), 1), MAX_KEYS_LIMIT)
+    else:
+        max_keys = DEFAULT_MAX_KEYS
+
+    continuation_token = request.GET.get("continuation_token")
+
+    result = await run_in_s3_executor(
+        list_files_in_s3, prefix, max_keys, continuation_token
+    )
 
     if result["success"]:
-        return JsonResponse(
-            {"success": True, "files": result["files"], "count": result["count"]},
+        return json_response(
+            {
+                "success": True,
+                "files": result["files"],
+                "count": result["count"],
+                "is_truncated": result["is_truncated"],
+                "continuation_token": result["continuation_token"],
+            },
             status=200,
         )
     else:
-        return JsonResponse(
+        return json_response(
             {"success": False, "error": result.get("error", "Unknown error occurred")},
-            status=500,
+            status=400 if result.get("invalid_token") else 500,
         )
 
 
+# Documentation about the available endpoints. It never changes, so it is
+# serialized once at import time and served with an ETag.
+API_INFO = {
+    "name": "S3 File Management API",
+    "version": "1.0",
+    "endpoints": {
+        "upload": {
+            "url": "/s3/upload/",
+            "method": "POST",
+            "description": "Upload a file to S3",
+            "example": 'curl -X POST -F "file=@/path/to/file.txt" http://localhost:8000/s3/upload/',
+        },
+        "upload_batch": {
+            "url": "/s3/upload-batch/",
+            "method": "POST",
+            "description": "Upload several files to S3 in parallel",
+            "example": 'curl -X POST -F "files=@a.txt" -F "files=@b.txt" http://localhost:8000/s3/upload-batch/',
+        },
+        "download": {
+            "url": "/s3/download/<file_key>/",
+            "method": "GET",
+            "description": "Download a file from S3",
+            "example": "curl -O http://localhost:8000/s3/download/<file_key>/",
+        },
+        "download_presigned": {
+            "url": "/s3/presigned/<file_key>/",
+            "method": "GET",
+            "description": "Redirect to a short-lived presigned S3 download URL",
+            "example": "curl -L -O http://localhost:8000/s3/presigned/<file_key>/",
+        },
+        "delete": {
+            "url": "/s3/delete/<file_key>/",
+            "method": "DELETE",
+            "description": "Delete a file from S3",
+            "example": "curl -X DELETE http://localhost:8000/s3/delete/<file_key>/",
+        },
+        "delete_batch": {
+            "url": "/s3/delete-batch/",
+            "method": "POST",
+            "description": "Delete several files from S3",
+            "example": 'curl -X POST -H "Content-Type: application/json" -d \'{"keys": ["<file_key>"]}\' http://localhost:8000/s3/delete-batch/',
+        },
+        "list": {
+            "url": "/s3/list/",
+            "method": "GET",
+            "description": "List files in S3 bucket",
+            "parameters": {
+                "prefix": "Filter files by prefix (optional)",
+                "max_keys": "Maximum number of files to return (optional, default: 100)",
+                "continuation_token": "Token from a truncated response, to fetch the next batch (optional)",
+            },
+            "example": "curl http://localhost:8000/s3/list/?prefix=images/&max_keys=50",
+        },
+    },
+}
+_API_INFO_BYTES = orjson.dumps(API_INFO)
+_API_INFO_ETAG = hashlib.sha256(_API_INFO_BYTES).hexdigest()
+
+
 @require_http_methods(["GET"])
-def api_info(request):
+@etag(lambda request: _API_INFO_ETAG)
+async def api_info(request):
     """
     API information endpoint
 
     Returns documentation about available endpoints
     """
-    info = {
-        "name": "S3 File Management API",
-        "version": "1.0",
-        "endpoints": {
-            "upload": {
-                "url": "/s3/upload/",
-                "method": "POST",
-                "description": "Upload a file to S3",
-                "example": 'curl -X POST -F "file=@/path/to/file.txt" http://localhost:8000/s3/upload/',
-            },
-            "download": {
-                "url": "/s3/download/<file_key>/",
-                "method": "GET",
-                "description": "Download a file from S3",
-                "example": "curl -O http://localhost:8000/s3/download/<file_key>/",
-            },
-            "delete": {
-                "url": "/s3/delete/<file_key>/",
-                "method": "DELETE",
-                "description": "Delete a file from S3",
-                "example": "curl -X DELETE http://localhost:8000/s3/delete/<file_key>/",
-            },
-            "list": {
-                "url": "/s3/list/",
-                "method": "GET",
-                "description": "List files in S3 bucket",
-                "parameters": {
-                    "prefix": "Filter files by prefix (optional)",
-                    "max_keys": "Maximum number of files to return (optional, default: 100)",
-                },
-                "example": "curl http://localhost:8000/s3/list/?prefix=images/&max_keys=50",
-            },
-        },
-    }
-    return JsonResponse(info, status=200)
+    return HttpResponse(_API_INFO_BYTES, content_type="application/json")
@@ -1,8 +1,24 @@
 from django.test import TestCase  # noqa: F401
 import datetime
+import hashlib
+import io
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import boto3
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import FileResponse
 from django.utils import timezone
 from django.urls import reverse
 
+from . import s3_utils
 from .models import Question
 
 # Create your tests here.
@@ -177,3 +193,559 @@ class VoteResultsViewTests(TestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "You did not select a choice.")
+
+
+class S3ClientTests(TestCase):
+    def setUp(self):
+        s3_utils._S3_CLIENT = None
+        self.addCleanup(setattr, s3_utils, "_S3_CLIENT", None)
+
+    @mock.patch("polls.s3_utils.boto3.client")
+    def test_client_is_created_once(self, client_factory):
+        """
+        get_s3_client() builds the boto3 client on first use and reuses it.
+        """
+        first = s3_utils.get_s3_client()
+        second = s3_utils.get_s3_client()
+        self.assertIs(first, second)
+        client_factory.assert_called_once()
+
+    def test_threads_share_one_connection_pool(self):
+        """
+        Concurrent first calls from several threads still create a single
+        client, so every S3 request goes through the same urllib3 pool.
+        """
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            clients = list(executor.map(lambda _: s3_utils.get_s3_client(), range(16)))
+        self.assertTrue(all(client is clients[0] for client in clients))
+        self.assertEqual(
+            clients[0].meta.config.max_pool_connections,
+            s3_utils.MAX_POOL_CONNECTIONS,
+        )
+        self.assertEqual(clients[0].meta.config.signature_version, "s3v4")
+
+
+class S3DownloadViewTests(TestCase):
+    @mock.patch("polls.s3_utils.get_s3_client")
+    async def test_download_streams_body(self, get_client):
+        """
+        The download view streams the S3 body in chunks and closes it.
+        """
+        body = mock.Mock()
+        body.read.side_effect = [b"hello ", b"world", b""]
+        get_client.return_value.get_object.return_value = {
+            "Body": body,
+            "ContentType": "text/plain",
+            "ContentLength": 11,
+        }
+        response = await self.async_client.get(
+            reverse(
+                "s3:file", kwargs={"op": "download", "file_key": "0123abcd/hello.txt"}
+            )
+        )
+        self.assertEqual(response.status_code, 200)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(content, b"hello world")
+        self.assertEqual(response["Content-Length"], "11")
+        self.assertEqual(
+            response["Content-Disposition"], 'attachment; filename="hello.txt"'
+        )
+        body.close.assert_called_once()
+
+    @mock.patch("polls.s3_utils.get_s3_client")
+    def test_wsgi_download_uses_file_response(self, get_client):
+        """
+        Under WSGI the S3 body is passed to a FileResponse so the server's
+        wsgi.file_wrapper can send it.
+        """
+        raw = io.BytesIO(b"hello world")
+        body = StreamingBody(raw, 11)
+        get_client.return_value.get_object.return_value = {
+            "Body": body,
+            "ContentType": "text/plain",
+            "ContentLength": 11,
+        }
+        response = self.client.get(
+            reverse("s3:file", kwargs={"op": "download", "file_key": "0123/a.txt"})
+        )
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(response.getvalue(), b"hello world")
+        self.assertEqual(response["Content-Length"], "11")
+        self.assertEqual(
+            response["Content-Disposition"], 'attachment; filename="a.txt"'
+        )
+        response.close()
+        self.assertTrue(raw.closed)
+
+    @mock.patch("polls.s3_utils.get_s3_client")
+    def test_download_forwards_if_none_match(self, get_client):
+        """
+        The client's If-None-Match is forwarded to S3, and a 304 from S3 is
+        returned to the client without a body.
+        """
+        get_client.return_value.get_object.side_effect = ClientError(
+            {
+                "Error": {"Code": "304", "Message": "Not Modified"},
+                "ResponseMetadata": {"HTTPHeaders": {"etag": '"abc"'}},
+            },
+            "GetObject",
+        )
+        response = self.client.get(
+            reverse("s3:file", kwargs={"op": "download", "file_key": "0123/a.txt"}),
+            HTTP_IF_NONE_MATCH='"xyz", "abc"',
+        )
+        self.assertEqual(response.status_code, 304)
+        # The object's ETag, not the client's If-None-Match list
+        self.assertEqual(response["ETag"], '"abc"')
+        get_client.return_value.get_object.assert_called_once_with(
+            Bucket=mock.ANY, Key="0123/a.txt", IfNoneMatch='"xyz", "abc"'
+        )
+
+
+class S3UploadTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch("polls.s3_utils.get_s3_client")
+        self.s3_client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.s3_client.head_object.side_effect = ClientError(
+            {"Error": {"Code": "404"}}, "HeadObject"
+        )
+
+    def test_key_is_derived_from_content(self):
+        """
+        The S3 key is a hash of the file content followed by the filename.
+        """
+        first = s3_utils.upload_file_to_s3(io.BytesIO(b"data"), "a.txt")
+        second = s3_utils.upload_file_to_s3(io.BytesIO(b"data"), "a.txt")
+        other = s3_utils.upload_file_to_s3(io.BytesIO(b"other"), "a.txt")
+        self.assertEqual(first["file_key"], second["file_key"])
+        self.assertNotEqual(first["file_key"], other["file_key"])
+        self.assertTrue(first["file_key"].endswith("/a.txt"))
+
+    def test_seekable_file_is_uploaded_without_copying(self):
+        """
+        Seekable files are hashed in place and uploaded directly, while other
+        streams are copied to a temporary file as they are hashed.
+        """
+        file_obj = io.BytesIO(b"data")
+        s3_utils.upload_file_to_s3(file_obj, "a.txt")
+        self.assertIs(self.s3_client.put_object.call_args.kwargs["Body"], file_obj)
+        self.assertFalse(file_obj.closed)
+
+        stream = io.BufferedReader(io.BytesIO(b"data"))
+        stream.seekable = lambda: False
+        result = s3_utils.upload_file_to_s3(stream, "a.txt")
+        self.assertIsNot(self.s3_client.put_object.call_args.kwargs["Body"], stream)
+        self.assertEqual(
+            result["file_key"].split("/")[0], hashlib.sha256(b"data").hexdigest()
+        )
+
+    def test_existing_content_is_not_uploaded_again(self):
+        self.s3_client.head_object.side_effect = None
+        result = s3_utils.upload_file_to_s3(io.BytesIO(b"data"), "a.txt")
+        self.assertTrue(result["success"])
+        self.assertTrue(result["deduplicated"])
+        self.s3_client.put_object.assert_not_called()
+        self.s3_client.upload_fileobj.assert_not_called()
+
+    def test_access_denied_head_object_still_uploads(self):
+        """
+        Without s3:ListBucket, S3 answers HeadObject for a missing key with 403,
+        which must not stop the upload.
+        """
+        self.s3_client.head_object.side_effect = ClientError(
+            {"Error": {"Code": "403"}}, "HeadObject"
+        )
+        with self.assertLogs("polls.s3_utils", "WARNING"):
+            result = s3_utils.upload_file_to_s3(io.BytesIO(b"data"), "a.txt")
+        self.assertTrue(result["success"], result.get("error"))
+        self.assertFalse(result["deduplicated"])
+        self.s3_client.put_object.assert_called_once()
+
+    @mock.patch("polls.s3_utils.LIST_CACHE_TIMEOUT", 30)
+    @mock.patch("polls.s3_utils.cache")
+    def test_cache_outage_does_not_fail_upload(self, mock_cache):
+        """
+        A file that reached S3 is reported as uploaded even if the cached
+        listings cannot be invalidated.
+        """
+        mock_cache.incr.side_effect = ConnectionError("redis down")
+        with self.assertLogs("polls.s3_utils", "WARNING"):
+            result = s3_utils.upload_file_to_s3(io.BytesIO(b"data"), "a.txt")
+        self.assertTrue(result["success"], result.get("error"))
+        self.s3_client.put_object.assert_called_once()
+
+    def test_small_file_uses_put_object(self):
+        """
+        Files below the multipart threshold are sent with a single PutObject.
+        """
+        result = s3_utils.upload_file_to_s3(
+            io.BytesIO(b"data"), "small.txt", "text/plain"
+        )
+        self.assertTrue(result["success"])
+        self.assertFalse(result["deduplicated"])
+        self.s3_client.put_object.assert_called_once()
+        self.assertEqual(
+            self.s3_client.put_object.call_args.kwargs["ContentType"], "text/plain"
+        )
+        self.s3_client.upload_fileobj.assert_not_called()
+
+    def test_large_file_uses_transfer_manager(self):
+        """
+        Files at or above the multipart threshold use the tuned transfer config.
+        """
+        content = b"x" * s3_utils.MULTIPART_THRESHOLD
+        result = s3_utils.upload_file_to_s3(io.BytesIO(content), "big.bin")
+        self.assertTrue(result["success"])
+        self.s3_client.put_object.assert_not_called()
+        _, kwargs = self.s3_client.upload_fileobj.call_args
+        self.assertIs(kwargs["Config"], s3_utils.TRANSFER_CONFIG)
+
+
+class S3ListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.s3_client = boto3.client(
+            "s3",
+            region_name="us-west-2",
+            aws_access_key_id="testing",
+            aws_secret_access_key="testing",
+        )
+        self.stubber = Stubber(self.s3_client)
+        self.stubber.activate()
+        self.addCleanup(self.stubber.deactivate)
+        patcher = mock.patch(
+            "polls.s3_utils.get_s3_client", return_value=self.s3_client
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_truncated_listing_returns_continuation_token(self):
+        """
+        When more objects exist than max_keys, the listing reports that it is
+        truncated and returns a token that resumes after the last object.
+        """
+        modified = datetime.datetime(2025, 11, 16, tzinfo=datetime.timezone.utc)
+        self.stubber.add_response(
+            "list_objects_v2",
+            {
+                "Contents": [
+                    {"Key": "a.txt", "Size": 1, "LastModified": modified},
+                    {"Key": "b.txt", "Size": 2, "LastModified": modified},
+                ],
+                "IsTruncated": True,
+                "NextContinuationToken": "next",
+            },
+        )
+        result = s3_utils.list_files_in_s3(max_keys=2)
+        self.assertTrue(result["success"])
+        self.assertEqual([f["key"] for f in result["files"]], ["a.txt", "b.txt"])
+        self.assertTrue(result["is_truncated"])
+        self.assertIsNotNone(result["continuation_token"])
+
+    @mock.patch("polls.s3_utils.LIST_CACHE_TIMEOUT", 30)
+    def test_listing_is_cached_until_a_file_is_deleted(self):
+        """
+        With listing caching enabled, repeated listings are served from the
+        cache, and deleting a file invalidates them.
+        """
+        self.stubber.add_response("list_objects_v2", {"IsTruncated": False})
+        self.stubber.add_response("delete_objects", {})
+        self.stubber.add_response("list_objects_v2", {"IsTruncated": False})
+
+        s3_utils.list_files_in_s3()
+        s3_utils.list_files_in_s3()
+        s3_utils.delete_file_from_s3("a.txt")
+        s3_utils.list_files_in_s3()
+        self.stubber.assert_no_pending_responses()
+
+    @mock.patch("polls.s3_utils.LIST_CACHE_TIMEOUT", 0)
+    def test_listing_is_not_cached_without_shared_cache(self):
+        """
+        Listing caching is off unless a shared cache backend is configured.
+        """
+        self.stubber.add_response("list_objects_v2", {"IsTruncated": False})
+        self.stubber.add_response("list_objects_v2", {"IsTruncated": False})
+        s3_utils.list_files_in_s3()
+        s3_utils.list_files_in_s3()
+        self.stubber.assert_no_pending_responses()
+
+    @mock.patch("polls.s3_utils.LIST_CACHE_TIMEOUT", 30)
+    @mock.patch("polls.s3_utils.cache")
+    def test_listing_falls_back_to_s3_when_cache_is_down(self, mock_cache):
+        mock_cache.get_or_set.side_effect = ConnectionError("redis down")
+        self.stubber.add_response("list_objects_v2", {"IsTruncated": False})
+        with self.assertLogs("polls.s3_utils", "WARNING"):
+            response = self.client.get(reverse("s3:list"))
+        self.assertEqual(response.status_code, 200)
+        self.stubber.assert_no_pending_responses()
+
+    def test_invalid_continuation_token_is_a_bad_request(self):
+        """
+        Continuation tokens rejected by botocore or S3 return a 400 instead
+        of a 500.
+        """
+        self.stubber.add_client_error("list_objects_v2", "InvalidArgument")
+        # The stubber needs a queued response for the call to get as far as
+        # botocore validating the parameters decoded from the token
+        self.stubber.add_response("list_objects_v2", {})
+        for token in ["garbage", "eyJhIjogMX0="]:
+            response = self.client.get(
+                reverse("s3:list"), {"continuation_token": token}
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_complete_listing_has_no_continuation_token(self):
+        self.stubber.add_response("list_objects_v2", {"IsTruncated": False})
+        result = s3_utils.list_files_in_s3()
+        self.assertEqual(result["files"], [])
+        self.assertFalse(result["is_truncated"])
+        self.assertIsNone(result["continuation_token"])
+
+
+class S3PresignedDownloadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    @mock.patch("polls.s3_utils.get_s3_client")
+    def test_redirects_to_cached_presigned_url(self, get_client):
+        """
+        The presigned download view redirects to S3 and reuses the signed URL
+        for repeated requests.
+        """
+        get_client.return_value.generate_presigned_url.return_value = (
+            "https://bucket.s3.amazonaws.com/abc_hello.txt?signature"
+        )
+        url = reverse("s3:download_presigned", args=("abc_hello.txt",))
+        first = self.client.get(url)
+        second = self.client.get(url)
+        self.assertRedirects(
+            first,
+            "https://bucket.s3.amazonaws.com/abc_hello.txt?signature",
+            fetch_redirect_response=False,
+        )
+        self.assertEqual(second["Location"], first["Location"])
+        get_client.return_value.generate_presigned_url.assert_called_once()
+        _, kwargs = get_client.return_value.generate_presigned_url.call_args
+        self.assertEqual(
+            kwargs["Params"]["ResponseContentDisposition"],
+            'attachment; filename="hello.txt"',
+        )
+
+    @mock.patch("polls.s3_utils.get_s3_client")
+    def test_filename_is_escaped_in_content_disposition(self, get_client):
+        get_client.return_value.generate_presigned_url.return_value = "https://s3"
+        self.client.get(reverse("s3:download_presigned", args=('0123/we"ird.txt',)))
+        _, kwargs = get_client.return_value.generate_presigned_url.call_args
+        self.assertEqual(
+            kwargs["Params"]["ResponseContentDisposition"],
+            'attachment; filename="we\\"ird.txt"',
+        )
+
+    @mock.patch("polls.s3_utils.get_s3_client")
+    def test_cache_key_is_valid_for_any_file_key(self, get_client):
+        """
+        Keys with spaces or over memcached's 250 character limit do not
+        produce cache key warnings.
+        """
+        get_client.return_value.generate_presigned_url.return_value = "https://s3"
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", CacheKeyWarning)
+            for file_key in ("abc/my file.txt", "abc/" + "x" * 1000):
+                result = s3_utils.generate_presigned_download_url(file_key, "f")
+                self.assertTrue(result["success"], result.get("error"))
+
+
+class S3DeleteTests(TestCase):
+    @mock.patch("polls.s3_utils.get_s3_client")
+    def test_delete_files_batches_requests(self, get_client):
+        """
+        Keys are sent to S3 in batches of at most DELETE_BATCH_SIZE.
+        """
+        get_client.return_value.delete_objects.return_value = {}
+        keys = [f"file{i}.txt" for i in range(s3_utils.DELETE_BATCH_SIZE + 1)]
+        result = s3_utils.delete_files_from_s3(keys)
+        self.assertTrue(result["success"])
+        self.assertEqual(result["deleted"], keys)
+        self.assertEqual(get_client.return_value.delete_objects.call_count, 2)
+
+    @mock.patch("polls.s3_utils.LIST_CACHE_TIMEOUT", 30)
+    @mock.patch("polls.s3_utils.get_s3_client")
+    def test_failed_batch_reports_keys_already_deleted(self, get_client):
+        """
+        When a later batch fails, the keys deleted by earlier batches are
+        reported and the cached listings are invalidated.
+        """
+        get_client.return_value.delete_objects.side_effect = [
+            {},
+            ClientError({"Error": {"Code": "InternalError"}}, "DeleteObjects"),
+        ]
+        cache.set(s3_utils.LIST_CACHE_VERSION_KEY, 1, timeout=None)
+        self.addCleanup(cache.clear)
+        keys = [f"file{i}.txt" for i in range(s3_utils.DELETE_BATCH_SIZE + 1)]
+        result = s3_utils.delete_files_from_s3(keys)
+        self.assertFalse(result["success"])
+        self.assertEqual(result["deleted"], keys[: s3_utils.DELETE_BATCH_SIZE])
+        self.assertEqual(cache.get(s3_utils.LIST_CACHE_VERSION_KEY), 2)
+
+    @mock.patch("polls.s3_utils.get_s3_client")
+    def test_delete_batch_view_reports_failed_keys(self, get_client):
+        get_client.return_value.delete_objects.return_value = {
+            "Errors": [{"Key": "b.txt", "Code": "AccessDenied", "Message": "Denied"}]
+        }
+        response = self.client.post(
+            reverse("s3:delete_batch"),
+            {"keys": ["a.txt", "b.txt"]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json()["deleted"], ["a.txt"])
+        self.assertEqual(
+            response.json()["errors"], [{"file_key": "b.txt", "error": "Denied"}]
+        )
+
+    def test_delete_batch_view_rejects_invalid_body(self):
+        response = self.client.post(
+            reverse("s3:delete_batch"), {"keys": []}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch("polls.s3_utils.get_s3_client")
+    def test_single_delete_uses_batch_helper(self, get_client):
+        get_client.return_value.delete_objects.return_value = {}
+        response = self.client.delete(
+            reverse("s3:file", kwargs={"op": "delete", "file_key": "a.txt"})
+        )
+        self.assertEqual(response.status_code, 200)
+        get_client.return_value.delete_objects.assert_called_once_with(
+            Bucket=mock.ANY, Delete={"Objects": [{"Key": "a.txt"}], "Quiet": True}
+        )
+
+
+class S3ApiInfoViewTests(TestCase):
+    def test_api_info_supports_conditional_get(self):
+        """
+        The API info payload carries an ETag, and a matching If-None-Match
+        returns 304 without a body.
+        """
+        response = self.client.get(reverse("s3:api_info"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["name"], "S3 File Management API")
+        response = self.client.get(
+            reverse("s3:api_info"), HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+
+class S3FileViewTests(TestCase):
+    def test_method_must_match_operation(self):
+        """
+        Downloads only accept GET and deletions only accept DELETE.
+        """
+        download_url = reverse(
+            "s3:file", kwargs={"op": "download", "file_key": "a.txt"}
+        )
+        delete_url = reverse("s3:file", kwargs={"op": "delete", "file_key": "a.txt"})
+        self.assertEqual(self.client.delete(download_url).status_code, 405)
+        self.assertEqual(self.client.get(delete_url).status_code, 405)
+        self.assertEqual(self.client.post(download_url).status_code, 405)
+
+
+class S3ListViewTests(TestCase):
+    @mock.patch("polls.s3_views.list_files_in_s3")
+    def test_max_keys_is_parsed_leniently(self, list_files_in_s3):
+        """
+        Missing or malformed max_keys falls back to the default, and large
+        values are capped at what S3 returns in one call.
+        """
+        list_files_in_s3.return_value = {
+            "success": True,
+            "files": [],
+            "count": 0,
+            "is_truncated": False,
+            "continuation_token": None,
+        }
+        for max_keys, expected in [
+            (None, 100),
+            ("abc", 100),
+            ("-5", 100),
+            ("0", 1),
+            ("50", 50),
+            ("5000", 1000),
+        ]:
+            params = {} if max_keys is None else {"max_keys": max_keys}
+            response = self.client.get(reverse("s3:list"), params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(list_files_in_s3.call_args.args[1], expected)
+
+    @mock.patch("polls.s3_views.list_files_in_s3")
+    def test_last_modified_is_serialized_as_iso_8601(self, list_files_in_s3):
+        modified = datetime.datetime(2025, 11, 16, 12, tzinfo=datetime.timezone.utc)
+        list_files_in_s3.return_value = {
+            "success": True,
+            "files": [{"key": "a.txt", "size": 1, "last_modified": modified}],
+            "count": 1,
+            "is_truncated": False,
+            "continuation_token": None,
+        }
+        response = self.client.get(reverse("s3:list"))
+        self.assertEqual(
+            response.json()["files"][0]["last_modified"], "2025-11-16T12:00:00+00:00"
+        )
+
+    def test_long_prefix_is_rejected(self):
+        response = self.client.get(reverse("s3:list"), {"prefix": "a" * 1024})
+        self.assertEqual(response.status_code, 400)
+
+
+class S3UploadBatchViewTests(TestCase):
+    @mock.patch("polls.s3_utils.get_s3_client")
+    def test_upload_batch_returns_result_per_file(self, get_client):
+        """
+        Every file in the request is uploaded, and the results come back in
+        request order.
+        """
+        get_client.return_value.head_object.side_effect = ClientError(
+            {"Error": {"Code": "404"}}, "HeadObject"
+        )
+        response = self.client.post(
+            reverse("s3:upload_batch"),
+            {
+                "files": [
+                    SimpleUploadedFile("a.txt", b"a"),
+                    SimpleUploadedFile("b.txt", b"b"),
+                ]
+            },
+        )
+        self.assertEqual(response.status_code, 201)
+        files = response.json()["files"]
+        self.assertEqual([f["original_filename"] for f in files], ["a.txt", "b.txt"])
+        self.assertEqual(get_client.return_value.put_object.call_count, 2)
+
+    @mock.patch("polls.s3_views.upload_file_to_s3")
+    def test_upload_batch_runs_on_its_own_executor(self, upload_file_to_s3):
+        """
+        Batch uploads do not take threads from the shared S3 executor.
+        """
+        thread_names = []
+
+        def upload(file_obj, filename, content_type):
+            thread_names.append(threading.current_thread().name)
+            return {"success": False, "error": "failed"}
+
+        upload_file_to_s3.side_effect = upload
+        self.client.post(
+            reverse("s3:upload_batch"),
+            {"files": [SimpleUploadedFile(f"{i}.txt", b"x") for i in range(20)]},
+        )
+        self.assertEqual(len(thread_names), 20)
+        self.assertTrue(
+            all(name.startswith("s3-upload-batch") for name in thread_names)
+        )
+
+    def test_upload_batch_requires_files(self):
+        response = self.client.post(reverse("s3:upload_batch"))
+        self.assertEqual(response.status_code, 400)